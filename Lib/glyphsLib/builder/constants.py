@@ -57,6 +57,7 @@ BACKGROUND_WIDTH_KEY = GLYPHLIB_PREFIX + "backgroundWidth"
 UFO_ORIGINAL_KERNING_GROUPS_KEY = GLYPHLIB_PREFIX + "originalKerningGroups"
 UFO_GROUPS_NOT_IN_FEATURE_KEY = GLYPHLIB_PREFIX + "groupsNotInFeature"
 UFO_KERN_GROUP_PATTERN = re.compile("^public\\.kern([12])\\.(.*)$")
+GLYPHS_KERN_GROUP_PATTERN = re.compile(r"@MMK_([LR])_(.+)")
 
 LOCKED_GUIDE_NAME_SUFFIX = " [locked]"
 
@@ -13,7 +13,7 @@
 # limitations under the License.
 
 
-from collections import defaultdict
+from itertools import filterfalse
 import os
 
 from glyphsLib import classes
@@ -21,56 +21,81 @@ from .constants import (
     UFO_ORIGINAL_KERNING_GROUPS_KEY,
     UFO_GROUPS_NOT_IN_FEATURE_KEY,
     UFO_KERN_GROUP_PATTERN,
+    GLYPHS_KERN_GROUP_PATTERN,
     BRACKET_GLYPH_RE,
 )
 
+# GSGlyph kerning group attribute keyed by (UFO group side, is RTL)
+_GLYPH_KERNING_ATTRS = {
+    (1, False): "rightKerningGroup",
+    (2, False): "leftKerningGroup",
+    (1, True): "leftKerningGroup",
+    (2, True): "rightKerningGroup",
+}
+
 
 def _get_glyphs_with_rtl_kerning(font):
     # Return a set of all glyph names that are referenced from font.kerningRTL,
     # either directly as single glyphs or as part of kerning groups.
 
-    rtl_glyphs = set()
     if not font.kerningRTL:
-        return rtl_glyphs
-
-    # sets of group names keyed by {left,right}KerningGroup
-    rtl_groups = defaultdict(set)
-    glyph_kerning_attr = {"R": "leftKerningGroup", "L": "rightKerningGroup"}
-
-    def mark_as_rtl(s, side):
-        if s.startswith(f"@MMK_{side}_"):
-            rtl_groups[glyph_kerning_attr[side]].add(s[7:])
-        else:  # single glyph
-            assert not s.startswith("@MMK_"), f"unexpected key in kerningRTL: {s}"
-            rtl_glyphs.add(s)
-
-    for kerning_id in {
-        m.id if m.metricsSource is None else m.metricsSource.id for m in font.masters
-    }:
-        for kern1, subtable in font.kerningRTL.get(kerning_id, {}).items():
-            mark_as_rtl(kern1, side="R")
-            for kern2 in subtable.keys():
-                mark_as_rtl(kern2, side="L")
+        return frozenset()
+
+    rtl_glyphs = set()
+
+    # Group names referenced as the first (right) resp. second (left) side of
+    # an RTL pair, i.e. the glyphs' leftKerningGroup resp. rightKerningGroup.
+    rtl_left_groups = set()
+    rtl_right_groups = set()
+    match_kern_group = GLYPHS_KERN_GROUP_PATTERN.match
+
+    seen = set()
+    for master in font.masters:
+        if master.metricsSource is None:
+            kerning_id = master.id
+        else:
+            kerning_id = master.metricsSource.id
+        if kerning_id in seen:
+            continue
+        seen.add(kerning_id)
+        subtables = font.kerningRTL.get(kerning_id)
+        if not subtables:
+            continue
+        for kern1, subtable in subtables.items():
+            match = match_kern_group(kern1)
+            if match is None:  # single glyph
+                rtl_glyphs.add(kern1)
+            elif match.group(1) == "R":
+                rtl_left_groups.add(match.group(2))
+            for kern2 in subtable:
+                match = match_kern_group(kern2)
+                if match is None:  # single glyph
+                    rtl_glyphs.add(kern2)
+                elif match.group(1) == "L":
+                    rtl_right_groups.add(match.group(2))
 
     for glyph in font.glyphs.values():
-        if glyph.name not in rtl_glyphs and any(
-            getattr(glyph, attr) in rtl_groups[attr]
-            for attr in glyph_kerning_attr.values()
+        name = glyph.name
+        if name in rtl_glyphs:
+            continue
+        if (
+            glyph.leftKerningGroup in rtl_left_groups
+            or glyph.rightKerningGroup in rtl_right_groups
         ):
-            rtl_glyphs.add(glyph.name)
+            rtl_glyphs.add(name)
 
-    return rtl_glyphs
+    return frozenset(rtl_glyphs)
 
 
 def to_ufo_groups(self):
     # Build groups once and then apply to all UFOs.
-    groups = defaultdict(list)
+    groups = {}
+    user_data = self.font.userData
 
     # Classes usually go to the feature file, unless we have our custom flag
-    group_names = None
-    if UFO_GROUPS_NOT_IN_FEATURE_KEY in self.font.userData.keys():
-        group_names = set(self.font.userData[UFO_GROUPS_NOT_IN_FEATURE_KEY])
+    group_names = user_data.get(UFO_GROUPS_NOT_IN_FEATURE_KEY)
     if group_names:
+        group_names = set(group_names)
         for gsclass in self.font.classes.values():
             if gsclass.name in group_names:
                 if gsclass.code:
@@ -84,25 +109,28 @@ def to_ufo_groups(self):
     #  - the original ordering
     #  - the kerning groups of glyphs that were not in the font (which can be
     #    stored in a UFO but not by Glyphs)
-    recovered = set()
-    orig_groups = self.font.userData.get(UFO_ORIGINAL_KERNING_GROUPS_KEY)
+    # Bit mask of the recovered sides (1 and 2 are distinct bits) by glyph name
+    recovered_sides = {}
+    orig_groups = user_data.get(UFO_ORIGINAL_KERNING_GROUPS_KEY)
     if orig_groups:
+        glyphs_by_name = {glyph.name: glyph for glyph in self.font.glyphs.values()}
         for group, glyphs in orig_groups.items():
             if not glyphs:
                 # Restore empty group
                 groups[group] = []
+                continue
+            side, group_name, attr = _parse_kern_group(group)
             for glyph_name in glyphs:
                 # Check that the original value is still valid
-                match = UFO_KERN_GROUP_PATTERN.match(group)
-                side = match.group(1)
-                group_name = match.group(2)
-                glyph = self.font.glyphs[glyph_name]
-                if not glyph or getattr(glyph, _glyph_kerning_attr(side)) == group_name:
+                glyph = glyphs_by_name.get(glyph_name)
+                if not glyph or getattr(glyph, attr) == group_name:
                     # The original grouping is still valid
-                    groups[group].append(glyph_name)
+                    groups.setdefault(group, []).append(glyph_name)
                     # Remember not to add this glyph again later
                     # Thus the original position in the list is preserved
-                    recovered.add((glyph_name, int(side)))
+                    recovered_sides[glyph_name] = (
+                        recovered_sides.get(glyph_name, 0) | side
+                    )
 
     # Read new/modified grouping values.
     # For glyphs that are used in Glyphs3's kerningRTL dict, take the opposite side:
@@ -112,71 +140,108 @@ def to_ufo_groups(self):
     # all Glyphs3's RTL kerning.
     # For more info: https://github.com/googlefonts/glyphsLib/pull/778
     rtl_glyphs = _get_glyphs_with_rtl_kerning(self.font)
+    ltr_attrs = (_glyph_kerning_attr(1, False), _glyph_kerning_attr(2, False))
+    rtl_attrs = (_glyph_kerning_attr(1, True), _glyph_kerning_attr(2, True))
+    prefixes = ("public.kern1.", "public.kern2.")
     for glyph in self.font.glyphs.values():
-        is_rtl = glyph.name in rtl_glyphs
-        for side in 1, 2:
-            if (glyph.name, side) not in recovered:
-                attr = _glyph_kerning_attr(side, is_rtl)
+        attrs = rtl_attrs if glyph.name in rtl_glyphs else ltr_attrs
+        recovered = recovered_sides.get(glyph.name, 0)
+        for side, attr, prefix in zip((1, 2), attrs, prefixes):
+            if not recovered & side:
                 group = getattr(glyph, attr)
                 if group:
-                    group = f"public.kern{side}.{group}"
-                    groups[group].append(glyph.name)
+                    group = prefix + group
+                    glyph_names = groups.get(group)
+                    if glyph_names is None:
+                        groups[group] = [glyph.name]
+                    else:
+                        glyph_names.append(glyph.name)
 
     # Update all UFOs with the same info
+    groups_items = list(groups.items())
     for source in self._sources.values():
-        for name, glyphs in groups.items():
-            # Shallow copy to prevent unexpected object sharing
-            source.font.groups[name] = glyphs[:]
+        target = source.font.groups
+        for name, glyphs in groups_items:
+            # Shallow copy to prevent unexpected object sharing: the lists are
+            # mutated per UFO later on, e.g. when bracket glyphs inherit the
+            # kerning groups of their parent (see _expand_kerning_to_brackets).
+            target[name] = glyphs.copy()
 
 
 def to_glyphs_groups(self):
     # Build the GSClasses from the groups of the first UFO.
+    sources = list(self._sources.values())
+    if not sources:
+        return
+    reference_ufo = sources[0].font
+
     groups = []
-    for source in self._sources.values():
-        for name, glyphs in source.font.groups.items():
-            # Filter out all BRACKET glyphs first, as they are created at
-            # to_designspace time to inherit glyph kerning to their bracket
-            # variants. They need to be removed because Glpyhs.app handles that
-            # on its own.
-            glyphs = [name for name in glyphs if not BRACKET_GLYPH_RE.match(name)]
-            if _is_kerning_group(name):
-                _to_glyphs_kerning_group(self, name, glyphs)
+    is_bracket_glyph = BRACKET_GLYPH_RE.match
+    glyphs_by_name = {glyph.name: glyph for glyph in self.font.glyphs.values()}
+    # Original kerning groups, only kept when minimizing UFO diffs
+    orig_kerning_groups = {} if self.minimize_ufo_diffs else None
+    for name, glyphs in reference_ufo.groups.items():
+        # Filter out all BRACKET glyphs first, as they are created at
+        # to_designspace time to inherit glyph kerning to their bracket
+        # variants. They need to be removed because Glpyhs.app handles that
+        # on its own.
+        if _is_kerning_group(name):
+            glyphs = list(filterfalse(is_bracket_glyph, glyphs))
+            _to_glyphs_kerning_group(
+                self, name, glyphs, glyphs_by_name, orig_kerning_groups
+            )
+        else:
+            code = " ".join(filterfalse(is_bracket_glyph, glyphs))
+            gsclass = classes.GSClass(name, code)
+            self.font.classes.append(gsclass)
+            groups.append(name)
+    if self.minimize_ufo_diffs:
+        user_data = self.font.userData
+        if orig_kerning_groups:
+            if user_data.get(UFO_ORIGINAL_KERNING_GROUPS_KEY):
+                user_data[UFO_ORIGINAL_KERNING_GROUPS_KEY].update(orig_kerning_groups)
             else:
-                gsclass = classes.GSClass(name, " ".join(glyphs))
-                self.font.classes.append(gsclass)
-                groups.append(name)
-        if self.minimize_ufo_diffs:
-            self.font.userData[UFO_GROUPS_NOT_IN_FEATURE_KEY] = groups
-        break
+                user_data[UFO_ORIGINAL_KERNING_GROUPS_KEY] = orig_kerning_groups
+        user_data[UFO_GROUPS_NOT_IN_FEATURE_KEY] = groups
 
     # Check that other UFOs are identical and print a warning if not.
-    for index, source in enumerate(self._sources.values()):
-        if index == 0:
-            reference_ufo = source.font
-        else:
-            _assert_groups_are_identical(self, reference_ufo, source.font)
+    if len(sources) > 1:
+        reference_sets = {
+            group: frozenset(glyphs) for group, glyphs in reference_ufo.groups.items()
+        }
+        for source in sources[1:]:
+            _assert_groups_are_identical(
+                self, reference_ufo, source.font, reference_sets
+            )
 
 
 def _is_kerning_group(name):
     return name.startswith(("public.kern1.", "public.kern2."))
 
 
-def _to_glyphs_kerning_group(self, name, glyphs):
-    if self.minimize_ufo_diffs:
+def _to_glyphs_kerning_group(
+    self, name, glyphs, glyphs_by_name, orig_kerning_groups=None
+):
+    if orig_kerning_groups is not None:
         # Preserve ordering when going from UFO group
         # to left/rightKerningGroup disseminated in GSGlyphs
         # back to UFO group.
-        if not self.font.userData.get(UFO_ORIGINAL_KERNING_GROUPS_KEY):
-            self.font.userData[UFO_ORIGINAL_KERNING_GROUPS_KEY] = {}
-        self.font.userData[UFO_ORIGINAL_KERNING_GROUPS_KEY][name] = glyphs
+        orig_kerning_groups[name] = glyphs
 
-    match = UFO_KERN_GROUP_PATTERN.match(name)
-    side = match.group(1)
-    group_name = match.group(2)
+    _, group_name, attr = _parse_kern_group(name)
     for glyph_name in glyphs:
-        glyph = self.font.glyphs[glyph_name]
+        glyph = glyphs_by_name.get(glyph_name)
         if glyph:
-            setattr(glyph, _glyph_kerning_attr(side), group_name)
+            setattr(glyph, attr, group_name)
+
+
+def _parse_kern_group(name):
+    """Return the side (1 or 2), the bare group name and the GSGlyph attribute
+    (left/rightKerningGroup) of a UFO kerning group name.
+    """
+    match = UFO_KERN_GROUP_PATTERN.match(name)
+    side = int(match.group(1))
+    return side, match.group(2), _glyph_kerning_attr(side)
 
 
 def _glyph_kerning_attr(side, is_rtl=False):
@@ -185,31 +250,30 @@ def _glyph_kerning_attr(side, is_rtl=False):
 
     Flip values for RTL kerning.
     """
-    side = int(side)
-    assert side in (1, 2), f"invalid kerning side: {side}"
-    if is_rtl:
-        side = 2 if side == 1 else 1
-    if side == 1:
-        return "rightKerningGroup"
-    else:
-        return "leftKerningGroup"
+    return _GLYPH_KERNING_ATTRS[side, is_rtl]
+
 
+def _assert_groups_are_identical(self, reference_ufo, ufo, reference_sets):
+    # Sibling masters usually share the exact same groups
+    if ufo.groups == reference_ufo.groups:
+        return
 
-def _assert_groups_are_identical(self, reference_ufo, ufo):
-    first_time = [True]  # Using a mutable as a non-local for closure below
+    warning = self.logger.warning
+    first_time = True
 
     def _warn(message, *args):
+        nonlocal first_time
         if first_time:
-            self.logger.warning(
+            warning(
                 "Using UFO `%s` as a reference for groups:",
                 _ufo_logging_ref(reference_ufo),
             )
-            first_time.clear()
-        self.logger.warning("   " + message, *args)
+            first_time = False
+        warning("   " + message, *args)
 
     # Check for inconsistencies
     for group, glyphs in ufo.groups.items():
-        if group not in reference_ufo.groups:
+        if group not in reference_sets:
             _warn(
                 "group `%s` from `%s` will be lost because it's not "
                 "defined in the reference UFO",
@@ -217,8 +281,8 @@ def _assert_groups_are_identical(self, reference_ufo, ufo):
                 _ufo_logging_ref(ufo),
             )
             continue
-        reference_glyphs = reference_ufo.groups[group]
-        if set(glyphs) != set(reference_glyphs):
+        if reference_sets[group] != set(glyphs):
+            reference_glyphs = reference_ufo.groups[group]
             _warn(
                 "group `%s` from `%s` will not be stored accurately because "
                 "it is different from the reference UFO",
@@ -13,11 +13,14 @@
 # limitations under the License.
 
 
-import re
 from collections import OrderedDict
 from copy import deepcopy
 
-from .constants import BRACKET_GLYPH_RE, UFO_KERN_GROUP_PATTERN
+from .constants import (
+    BRACKET_GLYPH_RE,
+    GLYPHS_KERN_GROUP_PATTERN,
+    UFO_KERN_GROUP_PATTERN,
+)
 
 
 def flip_class_side(s):
@@ -56,17 +59,17 @@ def _to_ufo_kerning(self, ufo, kerning_data):
     warning_msg = "Non-existent glyph class %s found in kerning rules."
 
     for left, pairs in kerning_data.items():
-        match = re.match(r"@MMK_L_(.+)", left)
-        left_is_class = bool(match)
+        match = GLYPHS_KERN_GROUP_PATTERN.match(left)
+        left_is_class = bool(match) and match.group(1) == "L"
         if left_is_class:
-            left = "public.kern1.%s" % match.group(1)
+            left = "public.kern1.%s" % match.group(2)
             if left not in ufo.groups:
                 self.logger.warning(warning_msg % left)
         for right, kerning_val in pairs.items():
-            match = re.match(r"@MMK_R_(.+)", right)
-            right_is_class = bool(match)
+            match = GLYPHS_KERN_GROUP_PATTERN.match(right)
+            right_is_class = bool(match) and match.group(1) == "R"
             if right_is_class:
-                right = "public.kern2.%s" % match.group(1)
+                right = "public.kern2.%s" % match.group(2)
                 if right not in ufo.groups:
                     self.logger.warning(warning_msg % right)
             ufo.kerning[left, right] = kerning_val
@@ -14,21 +14,19 @@
 # limitations under the License.
 
 
+import functools
 import os.path
-import shutil
 import sys
-import tempfile
 import unittest
 import xml.etree.ElementTree as etree
 from xmldiff import main, formatting
 
-import defcon
 from glyphsLib.builder.constants import GLYPHS_PREFIX
 from glyphsLib.builder.instances import set_weight_class, set_width_class
 from glyphsLib.classes import GSFont, GSFontMaster, GSInstance, GSFontInfoValue
 from glyphsLib import to_designspace, to_glyphs
-import ufoLib2
 
+DATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 
 # Current limitation of glyphsLib for designspace to designspace round-trip:
 # the designspace's axes, sources and instances must be as such:
@@ -121,8 +119,12 @@ def makeInstance(
     return inst
 
 
+@functools.lru_cache(maxsize=None)
 def makeInstanceDescriptor(*args, **kwargs):
-    """Same as makeInstance but return the corresponding InstanceDescriptor."""
+    """Same as makeInstance but return the corresponding InstanceDescriptor.
+
+    Results are cached, so callers must not modify the returned objects.
+    """
     ginst = makeInstance(*args, **kwargs)
     font = makeFont([makeMaster("Regular")], [ginst], "Family")
     doc = to_designspace(font)
@@ -137,40 +139,65 @@ def makeFont(masters, instances, familyName):
     return font
 
 
-class DesignspaceTest(unittest.TestCase):
-    def setUp(self):
-        self.tmpdir = tempfile.mkdtemp()
+# ElementTree caches compiled paths, repeated lookups do not re-parse them
+WGHT_AXIS_PATH = 'axes/axis[@tag="wght"]'
+INSTANCE_PATH = 'instances/instance[@stylename="%s"]'
+
+
+def _psname(doc, style):
+    return doc.find(INSTANCE_PATH % style).attrib.get("postscriptfontname")
+
 
-    def tearDown(self):
-        shutil.rmtree(self.tmpdir)
+def _canonical_xml(xml_data):
+    """Return the C14N 2.0 form of an XML document, ignoring the whitespace-only
+    text between elements (i.e. indentation) but keeping all other text as is.
+    """
+    root = etree.fromstring(xml_data)
+    for element in root.iter():
+        if element.text is not None and not element.text.strip():
+            element.text = None
+        if element.tail is not None and not element.tail.strip():
+            element.tail = None
+    return etree.canonicalize(etree.tostring(root, encoding="unicode"))
 
-    def write_to_tmp_path(self, doc, name):
-        path = os.path.join(self.tmpdir, name)
-        doc.write(path)
-        return path
+
+class DesignspaceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Canonical forms of the expected designspace files, by file name
+        cls._expected_cache = {}
+
+    def write_to_bytes(self, doc):
+        return doc.tostring()
 
     def expect_designspace(self, doc, expected_name):
-        dirname = os.path.dirname(__file__)
-        expected_path = os.path.join(dirname, "..", "data", expected_name)
-        return self._expect_designspace(doc, expected_path)
-
-    def _expect_designspace(self, doc, expected_path):
-        actual_path = self.write_to_tmp_path(doc, "generated.designspace")
-        actual_diff = main.diff_files(
-            actual_path, expected_path, formatter=formatting.DiffFormatter()
+        expected = self._expected_cache.get(expected_name)
+        if expected is None:
+            with open(os.path.join(DATA, expected_name), "rb") as fp:
+                expected = _canonical_xml(fp.read())
+            self._expected_cache[expected_name] = expected
+        return self._expect_designspace(doc, expected, expected_name)
+
+    def _expect_designspace(self, doc, expected, expected_name):
+        actual = _canonical_xml(self.write_to_bytes(doc))
+        if actual == expected:
+            return
+        # Only run the (much slower) xmldiff to check and report differences
+        # when the canonical forms don't match.
+        actual_diff = main.diff_texts(
+            actual, expected, formatter=formatting.DiffFormatter()
         )
         if len(actual_diff) != 0:
-            expected_name = os.path.basename(expected_path)
             sys.stderr.write("%s discrepancies (per xmldiff):\n" % (expected_name))
             for line in actual_diff.split("\n"):
                 sys.stderr.write("  %s" % (line))
             self.fail("*.designspace file is different from expected")
 
     def expect_designspace_roundtrip(self, doc):
-        actual_path = self.write_to_tmp_path(doc, "original.designspace")
+        expected = _canonical_xml(self.write_to_bytes(doc))
         font = to_glyphs(doc, minimize_ufo_diffs=True)
         rtdoc = to_designspace(font)
-        return self._expect_designspace(rtdoc, actual_path)
+        return self._expect_designspace(rtdoc, expected, "original.designspace")
 
     def test_basic(self):
         masters, instances = makeFamily()
@@ -232,9 +259,8 @@ class DesignspaceTest(unittest.TestCase):
         ]
         font = makeFont(masters, instances, "NoRegularMaster")
         designspace = to_designspace(font, instance_dir="out")
-        path = self.write_to_tmp_path(designspace, "noregular.designspace")
-        doc = etree.parse(path)
-        weightAxis = doc.find('axes/axis[@tag="wght"]')
+        doc = etree.fromstring(self.write_to_bytes(designspace))
+        weightAxis = doc.find(WGHT_AXIS_PATH)
         self.assertEqual(weightAxis.attrib["minimum"], "100")
         self.assertEqual(weightAxis.attrib["default"], "100")  # not 400
         self.assertEqual(weightAxis.attrib["maximum"], "900")
@@ -247,15 +273,9 @@ class DesignspaceTest(unittest.TestCase):
         black.customParameters["postscriptFontName"] = "PSNameTest-Superfat"
         font = makeFont([master], [thin, black], "PSNameTest")
         designspace = to_designspace(font, instance_dir="out")
-        path = self.write_to_tmp_path(designspace, "psname.designspace")
-        d = etree.parse(path)
-
-        def psname(doc, style):
-            inst = doc.find('instances/instance[@stylename="%s"]' % style)
-            return inst.attrib.get("postscriptfontname")
-
-        self.assertIsNone(psname(d, "Thin"))
-        self.assertEqual(psname(d, "Black"), "PSNameTest-Superfat")
+        d = etree.fromstring(self.write_to_bytes(designspace))
+        self.assertIsNone(_psname(d, "Thin"))
+        self.assertEqual(_psname(d, "Black"), "PSNameTest-Superfat")
 
         self.expect_designspace_roundtrip(designspace)
 
@@ -267,15 +287,9 @@ class DesignspaceTest(unittest.TestCase):
         )
         font = makeFont([master], [thin, black], "PSNameTest")
         designspace = to_designspace(font, instance_dir="out")
-        path = self.write_to_tmp_path(designspace, "psname.designspace")
-        d = etree.parse(path)
-
-        def psname(doc, style):
-            inst = doc.find('instances/instance[@stylename="%s"]' % style)
-            return inst.attrib.get("postscriptfontname")
-
-        self.assertIsNone(psname(d, "Thin"))
-        self.assertEqual(psname(d, "Black"), "PSNameTest-Superfat")
+        d = etree.fromstring(self.write_to_bytes(designspace))
+        self.assertIsNone(_psname(d, "Thin"))
+        self.assertEqual(_psname(d, "Black"), "PSNameTest-Superfat")
 
         self.expect_designspace_roundtrip(designspace)
 
@@ -352,11 +366,10 @@ class DesignspaceTest(unittest.TestCase):
         font = makeFont(masters, instances, "Family")
         font.customParameters["Variation Font Origin"] = "Medium"
         designspace = to_designspace(font, instance_dir="out")
-        path = self.write_to_tmp_path(designspace, "varfontorig.designspace")
-        doc = etree.parse(path)
+        doc = etree.fromstring(self.write_to_bytes(designspace))
         medium = doc.find('sources/source[@stylename="Medium"]')
         self.assertEqual(medium.find("lib").attrib["copy"], "1")
-        weightAxis = doc.find('axes/axis[@tag="wght"]')
+        weightAxis = doc.find(WGHT_AXIS_PATH)
         self.assertEqual(weightAxis.attrib["default"], "444")
 
         self.expect_designspace_roundtrip(designspace)
@@ -387,9 +400,7 @@ class DesignspaceTest(unittest.TestCase):
 
     def test_instance_filtering_by_family_name(self):
         # See https://github.com/googlefonts/fontmake/issues/257
-        path = os.path.join(
-            os.path.dirname(__file__), "..", "data", "MontserratStrippedDown.glyphs"
-        )
+        path = os.path.join(DATA, "MontserratStrippedDown.glyphs")
         font = GSFont(path)
 
         # By default (no special parameter), all instances are exported
@@ -420,114 +431,109 @@ WEIGHT_CLASS_KEY = GLYPHS_PREFIX + "weightClass"
 WIDTH_CLASS_KEY = GLYPHS_PREFIX + "widthClass"
 
 
-class SetWeightWidthClassesTestBase(object):
-    ufo_module = None  # subclasses must override this
-
-    def test_no_weight_class(self):
-        ufo = self.ufo_module.Font()
-        # name here says "Bold", however no explicit weightClass
-        # is assigned
-        doc, instance = makeInstanceDescriptor("Bold")
-        set_weight_class(ufo, doc, instance)
-        # the default OS/2 weight class is set
-        self.assertEqual(ufo.info.openTypeOS2WeightClass, 400)
-
-    def test_weight_class(self):
-        ufo = self.ufo_module.Font()
-        doc, data = makeInstanceDescriptor("Bold", weight=("Bold", None, 150))
-
-        set_weight_class(ufo, doc, data)
-        self.assertEqual(ufo.info.openTypeOS2WeightClass, 700)
-
-    def test_explicit_default_weight(self):
-        ufo = self.ufo_module.Font()
-        doc, data = makeInstanceDescriptor("Regular", weight=("Regular", None, 100))
-
-        set_weight_class(ufo, doc, data)
-        # the default OS/2 weight class is set
-        self.assertEqual(ufo.info.openTypeOS2WeightClass, 400)
-
-    def test_no_width_class(self):
-        ufo = self.ufo_module.Font()
-        # no explicit widthClass set, instance name doesn't matter
-        doc, data = makeInstanceDescriptor("Normal")
-        set_width_class(ufo, doc, data)
-        # the default OS/2 width class is set
-        self.assertEqual(ufo.info.openTypeOS2WidthClass, 5)
-
-    def test_width_class(self):
-        ufo = self.ufo_module.Font()
-        doc, data = makeInstanceDescriptor("Condensed", width=("Condensed", 3, 80))
-
-        set_width_class(ufo, doc, data)
-        self.assertEqual(ufo.info.openTypeOS2WidthClass, 3)
-
-    def test_explicit_default_width(self):
-        ufo = self.ufo_module.Font()
-        doc, data = makeInstanceDescriptor("Regular", width=("Medium (normal)", 5, 100))
-
-        set_width_class(ufo, doc, data)
-        # the default OS/2 width class is set
-        self.assertEqual(ufo.info.openTypeOS2WidthClass, 5)
-
-    def test_weight_and_width_class(self):
-        ufo = self.ufo_module.Font()
-        doc, data = makeInstanceDescriptor(
-            "SemiCondensed ExtraBold",
-            weight=("ExtraBold", None, 160),
-            width=("SemiCondensed", 4, 90),
-        )
+def test_no_weight_class(ufo_module):
+    ufo = ufo_module.Font()
+    # name here says "Bold", however no explicit weightClass
+    # is assigned
+    doc, instance = makeInstanceDescriptor("Bold")
+    set_weight_class(ufo, doc, instance)
+    # the default OS/2 weight class is set
+    assert ufo.info.openTypeOS2WeightClass == 400
 
-        set_weight_class(ufo, doc, data)
-        set_width_class(ufo, doc, data)
-
-        self.assertEqual(ufo.info.openTypeOS2WeightClass, 800)
-        self.assertEqual(ufo.info.openTypeOS2WidthClass, 4)
-
-    def test_unknown_ui_string_but_defined_weight_class(self):
-        ufo = self.ufo_module.Font()
-        # "DemiLight" is not among the predefined weight classes listed in
-        # Glyphs.app/Contents/Frameworks/GlyphsCore.framework/Versions/A/
-        # Resources/weights.plist
-        # NOTE It is not possible from the user interface to set a custom
-        # string as instance 'weightClass' since the choice is constrained
-        # by a drop-down menu.
-        doc, data = makeInstanceDescriptor(
-            "DemiLight Italic", weight=("DemiLight", 350, 70)
-        )
 
-        set_weight_class(ufo, doc, data)
-
-        # Here we have set the weightClass to 350 so even though the string
-        # is wrong, our value of 350 should be used.
-        self.assertTrue(ufo.info.openTypeOS2WeightClass == 350)
-
-    def test_unknown_weight_class(self):
-        ufo = self.ufo_module.Font()
-        # "DemiLight" is not among the predefined weight classes listed in
-        # Glyphs.app/Contents/Frameworks/GlyphsCore.framework/Versions/A/
-        # Resources/weights.plist
-        # NOTE It is not possible from the user interface to set a custom
-        # string as instance 'weightClass' since the choice is constrained
-        # by a drop-down menu.
-        doc, data = makeInstanceDescriptor(
-            "DemiLight Italic", weight=("DemiLight", None, 70)
-        )
+def test_weight_class(ufo_module):
+    ufo = ufo_module.Font()
+    doc, data = makeInstanceDescriptor("Bold", weight=("Bold", None, 150))
 
-        set_weight_class(ufo, doc, data)
+    set_weight_class(ufo, doc, data)
+    assert ufo.info.openTypeOS2WeightClass == 700
 
-        # the default OS/2 weight class is set
-        self.assertEqual(ufo.info.openTypeOS2WeightClass, 400)
 
+def test_explicit_default_weight(ufo_module):
+    ufo = ufo_module.Font()
+    doc, data = makeInstanceDescriptor("Regular", weight=("Regular", None, 100))
 
-class SetWeightWidthClassesTestUfoLib2(
-    SetWeightWidthClassesTestBase, unittest.TestCase
-):
-    ufo_module = ufoLib2
+    set_weight_class(ufo, doc, data)
+    # the default OS/2 weight class is set
+    assert ufo.info.openTypeOS2WeightClass == 400
+
+
+def test_no_width_class(ufo_module):
+    ufo = ufo_module.Font()
+    # no explicit widthClass set, instance name doesn't matter
+    doc, data = makeInstanceDescriptor("Normal")
+    set_width_class(ufo, doc, data)
+    # the default OS/2 width class is set
+    assert ufo.info.openTypeOS2WidthClass == 5
+
+
+def test_width_class(ufo_module):
+    ufo = ufo_module.Font()
+    doc, data = makeInstanceDescriptor("Condensed", width=("Condensed", 3, 80))
+
+    set_width_class(ufo, doc, data)
+    assert ufo.info.openTypeOS2WidthClass == 3
+
+
+def test_explicit_default_width(ufo_module):
+    ufo = ufo_module.Font()
+    doc, data = makeInstanceDescriptor("Regular", width=("Medium (normal)", 5, 100))
+
+    set_width_class(ufo, doc, data)
+    # the default OS/2 width class is set
+    assert ufo.info.openTypeOS2WidthClass == 5
+
+
+def test_weight_and_width_class(ufo_module):
+    ufo = ufo_module.Font()
+    doc, data = makeInstanceDescriptor(
+        "SemiCondensed ExtraBold",
+        weight=("ExtraBold", None, 160),
+        width=("SemiCondensed", 4, 90),
+    )
+
+    set_weight_class(ufo, doc, data)
+    set_width_class(ufo, doc, data)
+
+    assert ufo.info.openTypeOS2WeightClass == 800
+    assert ufo.info.openTypeOS2WidthClass == 4
+
+
+def test_unknown_ui_string_but_defined_weight_class(ufo_module):
+    ufo = ufo_module.Font()
+    # "DemiLight" is not among the predefined weight classes listed in
+    # Glyphs.app/Contents/Frameworks/GlyphsCore.framework/Versions/A/
+    # Resources/weights.plist
+    # NOTE It is not possible from the user interface to set a custom
+    # string as instance 'weightClass' since the choice is constrained
+    # by a drop-down menu.
+    doc, data = makeInstanceDescriptor(
+        "DemiLight Italic", weight=("DemiLight", 350, 70)
+    )
+
+    set_weight_class(ufo, doc, data)
+
+    # Here we have set the weightClass to 350 so even though the string
+    # is wrong, our value of 350 should be used.
+    assert ufo.info.openTypeOS2WeightClass == 350
+
+
+def test_unknown_weight_class(ufo_module):
+    ufo = ufo_module.Font()
+    # "DemiLight" is not among the predefined weight classes listed in
+    # Glyphs.app/Contents/Frameworks/GlyphsCore.framework/Versions/A/
+    # Resources/weights.plist
+    # NOTE It is not possible from the user interface to set a custom
+    # string as instance 'weightClass' since the choice is constrained
+    # by a drop-down menu.
+    doc, data = makeInstanceDescriptor(
+        "DemiLight Italic", weight=("DemiLight", None, 70)
+    )
 
+    set_weight_class(ufo, doc, data)
 
-class SetWeightWidthClassesTestDefcon(SetWeightWidthClassesTestBase, unittest.TestCase):
-    ufo_module = defcon
+    # the default OS/2 weight class is set
+    assert ufo.info.openTypeOS2WeightClass == 400
 
 
 if __name__ == "__main__":
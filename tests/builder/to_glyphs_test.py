@@ -181,6 +181,61 @@ def test_groups(ufo_module):
     assert dict(ufo.groups) == groups_dict
 
 
+def test_groups_members_are_glyph_names_only(ufo_module):
+    ufo = ufo_module.Font()
+    a = ufo.newGlyph("A")
+    a.unicode = 0x0041
+    ufo.groups["public.kern1.A"] = ["A"]
+    # Not a glyph of the font, even though font.glyphs["0041"] would find "A"
+    # by its Unicode value
+    ufo.groups["public.kern1.missing"] = ["0041"]
+
+    font = to_glyphs([ufo], minimize_ufo_diffs=True)
+
+    assert font.glyphs["A"].rightKerningGroup == "A"
+
+    font.glyphs["A"].rightKerningGroup = "other"
+    (ufo,) = to_ufos(font)
+
+    # The missing glyph keeps its original group, regardless of glyph "A"
+    assert ufo.groups["public.kern1.missing"] == ["0041"]
+    assert ufo.groups["public.kern1.other"] == ["A"]
+
+
+def test_groups_differ_between_ufos(ufo_module, caplog):
+    regular = ufo_module.Font()
+    regular.info.styleName = "Regular"
+    bold = ufo_module.Font()
+    bold.info.styleName = "Bold"
+    for ufo in (regular, bold):
+        for name in ("T", "V", "o", "e"):
+            ufo.newGlyph(name)
+        ufo.groups["public.kern1.T"] = ["T", "V"]
+        ufo.groups["public.kern2.oe"] = ["o", "e"]
+    # Same members in a different order is not a conflict
+    bold.groups["public.kern1.T"] = ["V", "T"]
+    bold.groups["public.kern2.oe"] = ["o"]
+    bold.groups["com.whatever.extra"] = ["T"]
+
+    font = to_glyphs([regular, bold])
+
+    # The first UFO is the reference
+    assert font.glyphs["e"].leftKerningGroup == "oe"
+    assert "com.whatever.extra" not in font.classes
+
+    messages = [r.getMessage() for r in caplog.records]
+    assert messages[0] == "Using UFO `Regular` as a reference for groups:"
+    assert len([m for m in messages if "reference for groups" in m]) == 1
+    assert not any("public.kern1.T" in m for m in messages)
+    assert any(
+        "group `public.kern2.oe` from `Bold` will not be stored accurately" in m
+        for m in messages
+    )
+    assert any(
+        "group `com.whatever.extra` from `Bold` will be lost" in m for m in messages
+    )
+
+
 def test_guidelines(ufo_module):
     ufo = ufo_module.Font()
     a = ufo.newGlyph("a")